@@ -3,6 +3,8 @@ Configuration for Week 1 Assignment: Chapters 0 and 1
 Update this file with expected outputs for each assignment.
 """
 
+from functools import cache
+
 # Assignment metadata
 ASSIGNMENT_NAME = "Week 1: Intro to Python"
 NOTEBOOKS_TO_GRADE = [
@@ -217,6 +219,7 @@ POINTS = {
 TOTAL_POINTS = sum(POINTS.values())
 
 
+@cache
 def get_notebook_config(notebook_path: str):
     """
     Get test configuration for a specific notebook.
@@ -230,11 +233,12 @@ def get_notebook_config(notebook_path: str):
     return TEST_CONFIGS.get(notebook_path, {"questions": {}})
 
 
+@cache
 def get_all_configured_notebooks():
     """
-    Get list of all notebooks that have test configurations.
+    Get all notebooks that have test configurations.
     
     Returns:
-        List of notebook paths with configurations
+        Tuple of notebook paths with configurations
     """
-    return [nb for nb, config in TEST_CONFIGS.items() if config.get("questions")]
+    return tuple(nb for nb, config in TEST_CONFIGS.items() if config.get("questions"))
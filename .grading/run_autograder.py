@@ -3,8 +3,12 @@ Autograder runner script for GitHub Actions.
 This file should be placed in the .grading/ directory of student repositories.
 """
 
+import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, Tuple
 
 # Add .grading directory to path so we can import test_functions
 sys.path.insert(0, str(Path(__file__).parent))
@@ -13,6 +17,24 @@ import test_functions
 import assignment_config
 
 
+def _grade_one(notebook_path: str) -> Tuple[Dict, str]:
+    """
+    Grade a single configured notebook (runs in a worker process).
+    
+    Args:
+        notebook_path: Path to notebook (relative to repo root)
+        
+    Returns:
+        Tuple of (results dictionary, formatted results string)
+    """
+    notebook_full_path = Path.cwd() / notebook_path
+    
+    config = assignment_config.get_notebook_config(notebook_path)
+    results = test_functions.test_notebook(notebook_full_path, config)
+    
+    return results, test_functions.format_results_for_display(results)
+
+
 def run_autograder():
     """Run autograder on all configured notebooks."""
     
@@ -25,25 +47,28 @@ def run_autograder():
     print(f"Running Autograder: {assignment_config.ASSIGNMENT_NAME}")
     print(f"{'='*70}\n")
     
-    # Test each configured notebook
+    # Collect the notebooks that exist; missing ones are reported and skipped
+    notebook_paths = []
     for notebook_path in assignment_config.get_all_configured_notebooks():
-        notebook_full_path = repo_root / notebook_path
-        
-        if not notebook_full_path.exists():
+        if not (repo_root / notebook_path).exists():
             print(f"⚠️  Warning: {notebook_path} not found, skipping...")
             continue
-        
-        print(f"Testing: {notebook_path}")
-        
-        config = assignment_config.get_notebook_config(notebook_path)
-        results = test_functions.test_notebook(notebook_full_path, config)
-        
-        # Display results
-        print(test_functions.format_results_for_display(results))
-        
-        all_results.append(results)
-        total_score += results['overall_score']
-        max_total_score += results['max_score']
+        notebook_paths.append(notebook_path)
+    
+    # Notebooks are independent, so execute them in parallel worker processes.
+    # Printing stays in this process to keep the log in configuration order.
+    with ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as ex:
+        for notebook_path, (results, formatted) in zip(
+            notebook_paths, ex.map(_grade_one, notebook_paths)
+        ):
+            print(f"Testing: {notebook_path}")
+            
+            # Display results
+            print(formatted)
+            
+            all_results.append((results, formatted))
+            total_score += results['overall_score']
+            max_total_score += results['max_score']
     
     # Summary
     print(f"\n{'='*70}")
@@ -59,17 +84,22 @@ def run_autograder():
     print(f"  - Iterative development (commit history)")
     print(f"\n{'='*70}\n")
     
-    # Save results to file
-    with open('autograder_results.txt', 'w') as f:
-        f.write(f"Autograder Results: {assignment_config.ASSIGNMENT_NAME}\n")
-        f.write(f"{'='*70}\n\n")
-        f.write(f"Overall Automated Score: {total_score}/{max_total_score} ({total_score/max_total_score*100:.1f}%)\n\n")
-        
-        for results in all_results:
-            f.write(test_functions.format_results_for_display(results))
-            f.write("\n")
+    # Save results to file in a single write
+    parts = [
+        f"Autograder Results: {assignment_config.ASSIGNMENT_NAME}\n",
+        f"{'='*70}\n\n",
+        f"Overall Automated Score: {total_score}/{max_total_score} ({total_score/max_total_score*100:.1f}%)\n\n",
+    ]
+    for _, formatted in all_results:
+        parts.append(formatted + "\n")
+    Path('autograder_results.txt').write_text(''.join(parts))
+    
+    # Machine-readable copy for CI steps and other tooling
+    Path('autograder_results.json').write_text(
+        json.dumps([results for results, _ in all_results], indent=2)
+    )
     
-    print("✓ Results saved to autograder_results.txt")
+    print("✓ Results saved to autograder_results.txt and autograder_results.json")
     
     # Exit with success if any tests ran
     return 0 if all_results else 1
@@ -4,20 +4,153 @@ Used by both GitHub Actions autograder and local grading script.
 """
 
 import nbformat
+import nbformat.v4
 from nbconvert.preprocessors import ExecutePreprocessor
+import bisect
+import hashlib
+import io
+import json
+import os
 import re
+import tempfile
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, FrozenSet, List, NamedTuple, Tuple, Optional
 import subprocess
 
 
-def execute_notebook(notebook_path: Path, timeout: int = 600) -> nbformat.NotebookNode:
+# Executed notebooks are cached here, keyed by notebook path, size and mtime.
+# Set NBGRADE_NO_CACHE=1 to always re-execute (useful when debugging).
+CACHE_DIR = Path(__file__).parent / '.cache'
+
+# Whitespace runs, collapsed when comparing outputs
+_WS_RE = re.compile(r'\s+')
+
+# All linting checks in one pattern, so a cell is scanned once. Hits consume
+# at most one character (the long-line check none) so that several issues
+# on the same line are all reported.
+_LINT_RE = re.compile(
+    r'(?P<longline>^(?=.{101}))'
+    r'|(?P<plus>[a-zA-Z0-9](?=\+[a-zA-Z0-9]))'
+    r'|(?P<eq>[a-zA-Z0-9](?==[a-zA-Z0-9]))'
+    r'|(?P<camel>\b(?=[a-z]+[A-Z][a-zA-Z]*[^\S\n]*=)[a-z])',
+    re.MULTILINE
+)
+
+# Essay placeholder, matched case-insensitively without copying the answer
+_ANSWER_PLACEHOLDER_RE = re.compile(r'<\s*your\s*answer\s*>', re.IGNORECASE)
+
+# Cell output beyond this many bytes is ignored (expected outputs are short)
+_OUTPUT_CAP = 4096
+
+# Commit messages that are not considered descriptive
+_GENERIC_COMMIT_WORDS = frozenset(['update', 'done', 'fix', 'wip', 'change', 'commit', 'save'])
+
+
+class Question(NamedTuple):
+    """A configured question, flattened for fast attribute access."""
+    id: str
+    type: str
+    cell_index: int
+    points: int
+    description: str
+    expected_outputs: Tuple[str, ...]
+    expected_norms: FrozenSet[str]
+
+
+def compile_questions(test_config: Dict) -> Tuple[Question, ...]:
+    """
+    Flatten the questions of a notebook's test configuration.
+    
+    Args:
+        test_config: Dictionary with test configuration
+        
+    Returns:
+        Tuple of Question records, in configuration order
+        
+    Raises:
+        Exception if a question is missing a required key
+    """
+    questions = []
+    for question_id, question_config in test_config.get('questions', {}).items():
+        expected_outputs = question_config.get('expected_outputs', [])
+        if isinstance(expected_outputs, str):
+            expected_outputs = [expected_outputs]
+        
+        try:
+            questions.append(Question(
+                id=question_id,
+                type=question_config['type'],
+                cell_index=question_config['cell_index'],
+                points=question_config.get('points', 1),
+                description=question_config.get('description', ''),
+                expected_outputs=tuple(expected_outputs),
+                expected_norms=frozenset(_normalize(expected) for expected in expected_outputs)
+            ))
+        except KeyError as e:
+            raise Exception(f"Invalid configuration for {question_id}: missing {e}")
+    
+    return tuple(questions)
+
+
+def _read_notebook(text: str) -> nbformat.NotebookNode:
+    """
+    Parse notebook JSON without nbformat's schema validation.
+    
+    Validation dominates parse time for notebooks with large (e.g. image)
+    outputs, and grading only reads a handful of cells. Notebooks in an
+    older format still go through nbformat so they are upgraded to v4.
+    
+    Args:
+        text: Raw notebook JSON
+        
+    Returns:
+        Notebook object
+    """
+    nb_dict = json.loads(text)
+    if nb_dict.get('nbformat') != 4:
+        return nbformat.reads(text, as_version=4)
+    return nbformat.v4.to_notebook_json(nb_dict)
+
+
+def _is_already_executed(nb: nbformat.NotebookNode) -> bool:
+    """
+    Check if every non-empty code cell of a notebook has been executed.
+    
+    Used by execute_notebook when NBGRADE_TRUST_OUTPUTS=1 is set, to grade
+    the saved outputs instead of executing the notebook again. Cells that
+    ran without printing anything (e.g. assignments) have no outputs, so
+    only the execution count is checked.
+    
+    Args:
+        nb: Notebook object
+        
+    Returns:
+        True if all non-empty code cells have an execution count
+    """
+    return all(
+        cell.get('execution_count') is not None
+        for cell in nb.cells if cell.cell_type == 'code' and cell.source.strip()
+    )
+
+
+def execute_notebook(notebook_path: Path, timeout: int = 600,
+                     questions: Optional[Tuple[Question, ...]] = None) -> nbformat.NotebookNode:
     """
     Execute a Jupyter notebook and return the executed notebook object.
     
+    Results are cached on disk by the notebook's path, size and modification
+    time (like make), so unchanged notebooks are only read and executed
+    once. If the notebook's questions are given, cells after the last
+    tested cell are not executed (and not returned), so an error in one of
+    them no longer fails the notebook.
+    
+    With NBGRADE_TRUST_OUTPUTS=1, a notebook whose non-empty code cells have
+    all been executed is returned as is, without executing it again.
+    
     Args:
         notebook_path: Path to the notebook file
         timeout: Maximum time in seconds for execution
+        questions: Optional questions the notebook is graded on
         
     Returns:
         Executed notebook object
@@ -25,22 +158,72 @@ def execute_notebook(notebook_path: Path, timeout: int = 600) -> nbformat.Notebo
     Raises:
         Exception if notebook fails to execute
     """
-    with open(notebook_path) as f:
-        nb = nbformat.read(f, as_version=4)
+    st = notebook_path.stat()
+    
+    # Cells after the last tested one are never inspected
+    max_idx = max((q.cell_index for q in questions or ()), default=None)
+    
+    use_cache = not os.environ.get('NBGRADE_NO_CACHE')
+    key = hashlib.blake2b(
+        f'{notebook_path.resolve()}\0{st.st_size}\0{st.st_mtime_ns}'.encode(),
+        digest_size=16
+    ).hexdigest()
+    if max_idx is not None:
+        key = f'{key}-{max_idx + 1}'
+    cache_path = CACHE_DIR / f'{key}.ipynb'
+    
+    # Unchanged notebooks were already executed on a previous run; the cache
+    # entry must also be newer than the notebook it was created from
+    if use_cache and cache_path.exists() and cache_path.stat().st_mtime_ns > st.st_mtime_ns:
+        try:
+            return _read_notebook(cache_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            pass  # Unreadable entry: treat as a miss and overwrite it below
+    
+    nb = _read_notebook(notebook_path.read_text(encoding='utf-8'))
+    if max_idx is not None:
+        nb.cells = nb.cells[:max_idx + 1]
+    
+    # Opt-in: trust outputs the student committed rather than re-executing
+    if os.environ.get('NBGRADE_TRUST_OUTPUTS') == '1' and _is_already_executed(nb):
+        return nb
     
     ep = ExecutePreprocessor(timeout=timeout, kernel_name='python3')
     
     try:
         ep.preprocess(nb, {'metadata': {'path': notebook_path.parent}})
-        return nb
     except Exception as e:
         raise Exception(f"Error executing {notebook_path.name}: {str(e)}")
+    
+    if use_cache:
+        # Write to a temporary file and move it into place, so an interrupted
+        # write never leaves a truncated entry behind. The cache is only an
+        # optimization, so failing to write it must not fail grading.
+        try:
+            CACHE_DIR.mkdir(exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    nbformat.write(nb, f)
+                os.replace(tmp_path, cache_path)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+        except OSError:
+            pass
+    
+    return nb
 
 
 def get_cell_output(nb: nbformat.NotebookNode, cell_index: int) -> str:
     """
     Extract text output from a specific cell in an executed notebook.
     
+    Image outputs are skipped and the text is truncated to _OUTPUT_CAP bytes.
+    
     Args:
         nb: Executed notebook object
         cell_index: Index of the cell (0-based)
@@ -56,16 +239,23 @@ def get_cell_output(nb: nbformat.NotebookNode, cell_index: int) -> str:
     if cell.cell_type != 'code':
         return ""
     
-    output_text = []
+    output_text = bytearray()
     for output in cell.get('outputs', []):
         if output.output_type == 'stream':
-            output_text.append(output.text)
-        elif output.output_type == 'execute_result':
-            output_text.append(output.data.get('text/plain', ''))
-        elif output.output_type == 'display_data':
-            output_text.append(output.data.get('text/plain', ''))
+            text = output.text
+        elif output.output_type in ('execute_result', 'display_data'):
+            # Images are never compared as text and can be very large
+            if any(mime.startswith('image/') for mime in output.data):
+                continue
+            text = output.data.get('text/plain', '')
+        else:
+            continue
+        
+        output_text.extend(text[:_OUTPUT_CAP].encode('utf-8'))
+        if len(output_text) >= _OUTPUT_CAP:
+            break
     
-    return ''.join(output_text).strip()
+    return output_text[:_OUTPUT_CAP].decode('utf-8', errors='ignore').strip()
 
 
 def get_cell_source(nb: nbformat.NotebookNode, cell_index: int) -> str:
@@ -85,6 +275,11 @@ def get_cell_source(nb: nbformat.NotebookNode, cell_index: int) -> str:
     return nb.cells[cell_index].source
 
 
+def _normalize(text: str) -> str:
+    """Normalize whitespace and case for flexible output comparison."""
+    return _WS_RE.sub(' ', text.lower().strip())
+
+
 def check_output_matches(actual: str, expected: str, flexible: bool = True) -> bool:
     """
     Check if actual output matches expected output.
@@ -98,10 +293,7 @@ def check_output_matches(actual: str, expected: str, flexible: bool = True) -> b
         True if outputs match
     """
     if flexible:
-        # Normalize whitespace and case
-        actual_normalized = re.sub(r'\s+', ' ', actual.lower().strip())
-        expected_normalized = re.sub(r'\s+', ' ', expected.lower().strip())
-        return actual_normalized == expected_normalized
+        return _normalize(actual) == _normalize(expected)
     else:
         return actual.strip() == expected.strip()
 
@@ -118,7 +310,9 @@ def check_code_contains_ellipsis(source: str) -> bool:
     """
     # Match ... that's not part of a string or comment
     # Simple check: look for ... on its own or in print(...)
-    return '...' in source and not ('"""' in source or "'''" in source)
+    if '...' not in source:
+        return False
+    return not ('"""' in source or "'''" in source)
 
 
 def check_essay_answered(nb: nbformat.NotebookNode, cell_index: int, min_length: int = 20) -> Tuple[bool, str]:
@@ -144,7 +338,7 @@ def check_essay_answered(nb: nbformat.NotebookNode, cell_index: int, min_length:
     answer = cell.source.strip()
     
     # Check if still contains placeholder
-    if '< your answer >' in answer.lower():
+    if _ANSWER_PLACEHOLDER_RE.search(answer):
         return False, answer
     
     # Check minimum length
@@ -154,6 +348,39 @@ def check_essay_answered(nb: nbformat.NotebookNode, cell_index: int, min_length:
     return True, answer
 
 
+def _line_suggestions(line_no: int, line: str, issues: set) -> List[str]:
+    """
+    Turn the linting issues found on one line into suggestions.
+    
+    Args:
+        line_no: Line number (1-based)
+        line: Text of the line
+        issues: Names of the _LINT_RE groups that matched on the line
+        
+    Returns:
+        List of linting suggestions for the line
+    """
+    # Skip empty lines and comments
+    if not line.strip() or line.strip().startswith('#'):
+        return []
+    
+    suggestions = []
+    
+    # Check line length (PEP 8 recommends max 79 characters)
+    if 'longline' in issues:  # Being lenient for beginners
+        suggestions.append(f"Line {line_no} is very long ({len(line)} chars). Consider breaking it up.")
+    
+    # Check for missing spaces around operators
+    if ('plus' in issues or 'eq' in issues) and '==' not in line:  # Don't flag comparison operators
+        suggestions.append(f"Line {line_no}: Consider adding spaces around operators for readability.")
+    
+    # Check for variable names with mixed case (not following snake_case)
+    if 'camel' in issues:
+        suggestions.append(f"Line {line_no}: Consider using snake_case for variable names (e.g., my_variable).")
+    
+    return suggestions
+
+
 def run_basic_linting(source: str) -> List[str]:
     """
     Run basic code quality checks and return list of suggestions.
@@ -166,27 +393,28 @@ def run_basic_linting(source: str) -> List[str]:
     """
     suggestions = []
     
-    lines = source.split('\n')
+    # Offsets of all line breaks, to look up a match's line by bisection
+    newlines = [m.start() for m in re.finditer('\n', source)]
     
-    for i, line in enumerate(lines, 1):
-        # Skip empty lines and comments
-        if not line.strip() or line.strip().startswith('#'):
-            continue
-        
-        # Check line length (PEP 8 recommends max 79 characters)
-        if len(line) > 100:  # Being lenient for beginners
-            suggestions.append(f"Line {i} is very long ({len(line)} chars). Consider breaking it up.")
+    # Matches arrive in source order; collect the issues of one line and
+    # report them once the scan moves on to the next line
+    line_no, line, issues = 0, '', set()
+    
+    for match in _LINT_RE.finditer(source):
+        idx = bisect.bisect_right(newlines, match.start())
         
-        # Check for missing spaces around operators
-        if re.search(r'[a-zA-Z0-9]\+[a-zA-Z0-9]', line) or \
-           re.search(r'[a-zA-Z0-9]=[a-zA-Z0-9]', line.replace('==', '')):
-            if '==' not in line:  # Don't flag comparison operators
-                suggestions.append(f"Line {i}: Consider adding spaces around operators for readability.")
+        if idx + 1 != line_no:
+            suggestions.extend(_line_suggestions(line_no, line, issues))
+            if len(suggestions) >= 3:
+                break
+            
+            line_start = newlines[idx - 1] + 1 if idx > 0 else 0
+            line_end = newlines[idx] if idx < len(newlines) else len(source)
+            line_no, line, issues = idx + 1, source[line_start:line_end], set()
         
-        # Check for variable names with mixed case (not following snake_case)
-        var_pattern = r'\b([a-z]+[A-Z][a-zA-Z]*)\s*='
-        if re.search(var_pattern, line):
-            suggestions.append(f"Line {i}: Consider using snake_case for variable names (e.g., my_variable).")
+        issues.add(match.lastgroup)
+    else:
+        suggestions.extend(_line_suggestions(line_no, line, issues))
     
     return suggestions[:3]  # Limit to 3 suggestions to avoid overwhelming
 
@@ -203,17 +431,7 @@ def analyze_commits(repo_path: Path, min_commits: int = 3) -> Dict[str, any]:
         Dictionary with commit analysis results
     """
     try:
-        # Get commit count
-        result = subprocess.run(
-            ['git', 'rev-list', '--count', 'HEAD'],
-            cwd=repo_path,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        commit_count = int(result.stdout.strip())
-        
-        # Get commit messages
+        # Get commit messages (one per line, so they also give the count)
         result = subprocess.run(
             ['git', 'log', '--pretty=format:%s'],
             cwd=repo_path,
@@ -221,14 +439,14 @@ def analyze_commits(repo_path: Path, min_commits: int = 3) -> Dict[str, any]:
             text=True,
             check=True
         )
-        messages = result.stdout.strip().split('\n')
+        messages = result.stdout.split('\n') if result.stdout else []
+        commit_count = len(messages)
         
         # Analyze message quality
         descriptive_count = 0
         for msg in messages:
             # Consider message descriptive if it's longer than 10 chars and not generic
-            generic_words = ['update', 'done', 'fix', 'wip', 'change', 'commit', 'save']
-            is_generic = msg.lower().strip() in generic_words
+            is_generic = msg.lower().strip() in _GENERIC_COMMIT_WORDS
             is_long_enough = len(msg.strip()) >= 10
             
             if is_long_enough and not is_generic:
@@ -274,49 +492,43 @@ def test_notebook(notebook_path: Path, test_config: Dict) -> Dict:
     }
     
     try:
+        # Flatten the configured questions; configuration errors are
+        # reported for this notebook only
+        questions = compile_questions(test_config)
+        
         # Execute notebook
-        nb = execute_notebook(notebook_path)
+        nb = execute_notebook(notebook_path, questions=questions)
         results['executed'] = True
         
         # Test each question
-        for question_id, question_config in test_config.get('questions', {}).items():
+        for question in questions:
             question_result = {
                 'passed': False,
                 'score': 0,
-                'max_score': question_config.get('points', 1),
+                'max_score': question.points,
                 'feedback': []
             }
             
             results['max_score'] += question_result['max_score']
             
-            if question_config['type'] == 'code':
-                cell_index = question_config['cell_index']
-                source = get_cell_source(nb, cell_index)
+            if question.type == 'code':
+                source = get_cell_source(nb, question.cell_index)
                 
                 # Check if still contains ellipsis
                 if check_code_contains_ellipsis(source):
                     question_result['feedback'].append("Code still contains '...' placeholder")
                 else:
                     # Get output
-                    output = get_cell_output(nb, cell_index)
-                    
-                    # Check expected outputs
-                    expected_outputs = question_config.get('expected_outputs', [])
-                    if isinstance(expected_outputs, str):
-                        expected_outputs = [expected_outputs]
-                    
-                    matched = False
-                    for expected in expected_outputs:
-                        if check_output_matches(output, expected):
-                            matched = True
-                            break
+                    output = get_cell_output(nb, question.cell_index)
                     
-                    if matched:
+                    # Expected outputs are normalized when the questions are
+                    # compiled; only the actual output needs normalizing here
+                    if _normalize(output) in question.expected_norms:
                         question_result['passed'] = True
                         question_result['score'] = question_result['max_score']
                         question_result['feedback'].append("✓ Correct output")
                     else:
-                        question_result['feedback'].append(f"Expected output like: {expected_outputs[0][:50]}...")
+                        question_result['feedback'].append(f"Expected output like: {question.expected_outputs[0][:50]}...")
                         question_result['feedback'].append(f"Got: {output[:50]}...")
                     
                     # Run linting for feedback
@@ -325,9 +537,8 @@ def test_notebook(notebook_path: Path, test_config: Dict) -> Dict:
                         question_result['feedback'].append("Code quality suggestions:")
                         question_result['feedback'].extend(linting_suggestions)
             
-            elif question_config['type'] == 'essay':
-                cell_index = question_config['cell_index']
-                answered, answer_text = check_essay_answered(nb, cell_index)
+            elif question.type == 'essay':
+                answered, answer_text = check_essay_answered(nb, question.cell_index)
                 
                 if answered:
                     question_result['passed'] = True
@@ -336,7 +547,7 @@ def test_notebook(notebook_path: Path, test_config: Dict) -> Dict:
                 else:
                     question_result['feedback'].append("No answer provided or too short")
             
-            results['questions'][question_id] = question_result
+            results['questions'][question.id] = question_result
             results['overall_score'] += question_result['score']
     
     except Exception as e:
@@ -355,31 +566,33 @@ def format_results_for_display(results: Dict) -> str:
     Returns:
         Formatted string for display
     """
-    output = []
-    output.append(f"\n{'='*60}")
-    output.append(f"Results for: {results['notebook']}")
-    output.append(f"{'='*60}")
+    # Each line is written with its leading line break, so the text ends
+    # exactly where the last line does
+    output = io.StringIO()
+    output.write(f"\n{'='*60}")
+    output.write(f"\nResults for: {results['notebook']}")
+    output.write(f"\n{'='*60}")
     
     if not results['executed']:
-        output.append("❌ Failed to execute notebook")
+        output.write("\n❌ Failed to execute notebook")
         for error in results['errors']:
-            output.append(f"  Error: {error}")
-        return '\n'.join(output)
+            output.write(f"\n  Error: {error}")
+        return output.getvalue()
     
-    output.append(f"\nOverall Score: {results['overall_score']}/{results['max_score']} ({results['overall_score']/results['max_score']*100:.0f}%)")
-    output.append(f"\nQuestion Results:")
+    output.write(f"\n\nOverall Score: {results['overall_score']}/{results['max_score']} ({results['overall_score']/results['max_score']*100:.0f}%)")
+    output.write(f"\n\nQuestion Results:")
     
     for q_id, q_result in results['questions'].items():
         status = "✓" if q_result['passed'] else "✗"
-        output.append(f"\n{status} {q_id}: {q_result['score']}/{q_result['max_score']} points")
+        output.write(f"\n\n{status} {q_id}: {q_result['score']}/{q_result['max_score']} points")
         for feedback in q_result['feedback']:
-            output.append(f"  {feedback}")
+            output.write(f"\n  {feedback}")
     
     if results['errors']:
-        output.append(f"\nErrors:")
+        output.write(f"\n\nErrors:")
         for error in results['errors']:
-            output.append(f"  {error}")
+            output.write(f"\n  {error}")
     
-    output.append(f"\n{'='*60}\n")
+    output.write(f"\n\n{'='*60}\n")
     
-    return '\n'.join(output)
+    return output.getvalue()